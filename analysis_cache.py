@@ -0,0 +1,177 @@
+import numpy as np
+import hashlib
+import json
+import os
+import threading
+from lab_array import read_palette, srgb_to_lab_array, ita_array
+from palette_index import PaletteIndex
+
+# Content-addressed on-disk cache of per-image analysis results. Entries are
+# keyed by the image bytes, the palette files and the analysis parameters,
+# stored as compressed .npz files and evicted least recently used first once
+# the directory grows past its size cap. Clicked points and polygon ROIs go to
+# small sidecars next to each entry, so recording one never rewrites the
+# rasters; they count towards the cap and are evicted with their entry.
+
+CACHE_DIR = ".cache/analysis"
+MAX_CACHE_MB = 512
+SIDECARS = (".roi.csv", ".polygons.jsonl")
+ANALYSIS_VERSION = 1
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def analysis_key(image_path, palette_files, **params):
+    '''Cache key from the image content, palette contents and sampling parameters'''
+    h = hashlib.sha256()
+    h.update(file_digest(image_path).encode())
+    for namefile in palette_files:
+        h.update(file_digest(namefile).encode())
+    params["version"] = ANALYSIS_VERSION
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def analyze_image(img, palette_files, scale=255.0, dtype=np.float32, calibration=None):
+    '''Tone map per palette and ITA raster for an (H, W, 3+) RGB image'''
+    rgb = img[..., :3]
+    lab = srgb_to_lab_array(rgb, scale=scale, dtype=dtype, calibration=calibration)
+    result = {"ita": ita_array(lab).astype(np.float16)}
+    for i, namefile in enumerate(palette_files):
+        names, colors = read_palette(namefile)
+        index, distance = PaletteIndex(srgb_to_lab_array(colors, dtype=dtype)).query(lab, dtype=dtype)
+        result[f"tones_{i}"] = index.reshape(rgb.shape[:2]).astype(np.uint16)
+    return result
+
+
+class AnalysisCache:
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_MB * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        '''Cached arrays for key, or None. A hit marks the entry as recently used.'''
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        os.utime(path)
+        return result
+
+    def put(self, key, arrays):
+        path = self._path(key)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def _roi_path(self, key):
+        return os.path.join(self.directory, key + ".roi.csv")
+
+    def add_roi(self, key, x, y, tones):
+        '''Appends a clicked point and its tone index per palette to the entry's sidecar'''
+        with open(self._roi_path(key), "a") as f:
+            f.write(",".join(str(int(v)) for v in (x, y, *tones)) + "\n")
+
+    def rois(self, key):
+        '''(N, 2 + palettes) int array of the points recorded for key'''
+        try:
+            with open(self._roi_path(key)) as f:
+                rows = [[int(v) for v in line.split(",")] for line in f if line.strip()]
+        except FileNotFoundError:
+            return np.empty((0, 2), dtype=np.int32)
+        return np.array(rows, dtype=np.int32).reshape(len(rows), -1)
+
+    def _polygons_path(self, key):
+        return os.path.join(self.directory, key + ".polygons.jsonl")
+
+    def add_polygon(self, key, vertices, tones):
+        '''Appends a polygon ROI and the tone index of its mean per palette to the entry's sidecar'''
+        record = {"vertices": [[float(x), float(y)] for x, y in vertices], "tones": [int(t) for t in tones]}
+        with open(self._polygons_path(key), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def polygons(self, key):
+        '''List of ((V, 2) float vertices, tone index per palette) recorded for key'''
+        try:
+            with open(self._polygons_path(key)) as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        return [(np.array(r["vertices"], dtype=np.float64).reshape(-1, 2), r["tones"]) for r in records]
+
+    def evict(self):
+        # An entry is its .npz and sidecars; its last use is the latest of their mtimes
+        entries = {}
+        for name in os.listdir(self.directory):
+            suffix = next((s for s in (".npz",) + SIDECARS if name.endswith(s)), None)
+            if suffix is None:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            mtime, size, names = entries.get(name[:-len(suffix)], (0.0, 0, []))
+            entries[name[:-len(suffix)]] = (max(mtime, stat.st_mtime), size + stat.st_size, names + [name])
+        total = sum(size for _, size, _ in entries.values())
+        for mtime, size, names in sorted(entries.values()):
+            if total <= self.max_bytes:
+                break
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def cached_analysis(image_path, img, palette_files, cache=None, calibration=None):
+    '''Returns (key, analysis arrays), computing and storing them on a cache miss'''
+    job = BackgroundAnalysis(image_path, img, palette_files, cache, calibration, start=False)
+    if job.arrays is None:
+        job.run()
+    return job.key, job.arrays
+
+
+class BackgroundAnalysis:
+    '''Cache lookup for an image that, on a miss, analyzes it on a worker thread.
+
+    The key and any cached arrays are available straight away; otherwise arrays
+    stays None until ready is set. fresh tells whether this job computed them.
+    '''
+
+    def __init__(self, image_path, img, palette_files, cache=None, calibration=None, start=True):
+        self.img = img
+        self.palette_files = palette_files
+        self.cache = cache or AnalysisCache()
+        self.calibration = calibration
+        self.scale = 1.0 if img.dtype.kind == "f" else float(np.iinfo(img.dtype).max)
+        self.key = analysis_key(image_path, palette_files, scale=self.scale, dtype="float32", calibration=calibration)
+        self.arrays = self.cache.get(self.key)
+        self.fresh = False
+        self.ready = threading.Event()
+        if self.arrays is not None:
+            self.ready.set()
+        elif start:
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        arrays = analyze_image(self.img, self.palette_files, scale=self.scale, calibration=self.calibration)
+        self.cache.put(self.key, arrays)
+        self.fresh = True
+        self.arrays = arrays
+        self.ready.set()
@@ -0,0 +1,95 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import json
+import sys
+from cie2000 import CIEDE2000_array
+from image_io import read_image
+from lab_array import read_palette, srgb_to_lab_array, srgb_to_linear
+
+# Colour-chart calibration. The user clicks the centres of the four corner
+# patches of a 24-patch chart (dark skin, bluish green, black, white); patch
+# colours are averaged around the interpolated centres and a 3x3 correction in
+# linear RGB (optionally after a per-channel tone curve fitted on the neutral
+# row) is fitted against the reference values.
+
+REFERENCE_CHART = "assets/colorchecker_srgb.csv"
+CHART_ROWS, CHART_COLS = 4, 6
+NEUTRAL_PATCHES = slice(18, 24)
+
+
+def chart_patch_centers(corners, rows=CHART_ROWS, cols=CHART_COLS):
+    '''Patch centres, row by row, from the (x, y) centres of the top-left, top-right,
+    bottom-right and bottom-left patches'''
+    tl, tr, br, bl = (np.asarray(c, dtype=np.float64) for c in corners)
+    u = np.linspace(0, 1, cols)[None, :, None]
+    v = np.linspace(0, 1, rows)[:, None, None]
+    top = tl + u * (tr - tl)
+    bottom = bl + u * (br - bl)
+    return (top + v * (bottom - top)).reshape(-1, 2)
+
+
+def sample_patches(img, centers, radius=5):
+    '''Mean RGB in a (2 radius + 1) square window around each centre'''
+    samples = []
+    for x, y in np.rint(centers).astype(int):
+        window = img[max(y - radius, 0):y + radius + 1, max(x - radius, 0):x + radius + 1, :3]
+        samples.append(window.reshape(-1, 3).mean(axis=0))
+    return np.array(samples)
+
+
+def fit_calibration(measured, reference, tone_curve=False):
+    '''Fits {"matrix", "gamma"} mapping measured to reference sRGB (both in [0, 1])'''
+    measured_lin = srgb_to_linear(np.asarray(measured, dtype=np.float64))
+    reference_lin = srgb_to_linear(np.asarray(reference, dtype=np.float64))
+    gamma = None
+    if tone_curve:
+        # Per-channel power law on the neutral patches: log(ref) = gamma * log(measured)
+        m = np.log(np.clip(measured_lin[NEUTRAL_PATCHES], 1e-6, None))
+        r = np.log(np.clip(reference_lin[NEUTRAL_PATCHES], 1e-6, None))
+        gamma = (m * r).sum(axis=0) / (m * m).sum(axis=0)
+        measured_lin = np.clip(measured_lin, 0, None)**gamma
+    solution, *_ = np.linalg.lstsq(measured_lin, reference_lin, rcond=None)
+    return {"matrix": solution.T.tolist(), "gamma": None if gamma is None else gamma.tolist()}
+
+
+def chart_error(measured, reference, calibration=None):
+    '''Mean CIEDE2000 between the chart patches and their reference values'''
+    lab = srgb_to_lab_array(measured, scale=1.0, calibration=calibration)
+    return float(CIEDE2000_array(lab, srgb_to_lab_array(reference, scale=1.0)).mean())
+
+
+def save_calibration(namefile, calibration):
+    with open(namefile, "w") as f:
+        json.dump(calibration, f, indent=2)
+
+
+def load_calibration(namefile):
+    with open(namefile) as f:
+        return json.load(f)
+
+
+def calibrate_image(image_path, namefile, tone_curve=False):
+    img = read_image(image_path)
+    fig, ax = plt.subplots()
+    ax.imshow(img)
+    ax.axis('off')
+    ax.set_title("Click the centres of: dark skin, bluish green, black, white")
+    corners = plt.ginput(4, timeout=0)
+    plt.close(fig)
+
+    names, reference = read_palette(REFERENCE_CHART)
+    reference = reference / 255.0
+    measured = sample_patches(img, chart_patch_centers(corners))
+    calibration = fit_calibration(measured, reference, tone_curve)
+    save_calibration(namefile, calibration)
+    print(f"Chart Delta E before: {chart_error(measured, reference):.2f}, after: {chart_error(measured, reference, calibration):.2f}")
+    print("Calibration saved to", namefile)
+    return calibration
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) in (3, 4):
+        calibrate_image(argv[1], argv[2], tone_curve=len(argv) == 4 and argv[3] == "curve")
+    else:
+        print("Usage: python calibration.py <chart image> <calibration.json> [curve]")
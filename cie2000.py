@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 def CIEDE2000(Lab_1, Lab_2):
     '''Calculates CIEDE2000 color distance between two CIE L*a*b* colors'''
@@ -68,4 +69,70 @@ def CIEDE2000(Lab_1, Lab_2):
     f_H = dH_ / k_H / S_H
     
     dE_00 = math.sqrt(f_L**2 + f_C**2 + f_H**2 + R_T * f_C * f_H)
-    return dE_00
\ No newline at end of file
+    return dE_00
+
+def CIEDE2000_array(Lab_1, Lab_2, dtype=np.float64):
+    '''Vectorized CIEDE2000 over broadcastable (..., 3) Lab arrays, branch for branch with CIEDE2000'''
+    C_25_7 = 6103515625 # 25**7
+    two_pi = 2 * np.pi
+
+    Lab_1 = np.asarray(Lab_1, dtype=dtype)
+    Lab_2 = np.asarray(Lab_2, dtype=dtype)
+    L1, a1, b1 = Lab_1[..., 0], Lab_1[..., 1], Lab_1[..., 2]
+    L2, a2, b2 = Lab_2[..., 0], Lab_2[..., 1], Lab_2[..., 2]
+    C1 = np.sqrt(a1**2 + b1**2)
+    C2 = np.sqrt(a2**2 + b2**2)
+    C_ave = (C1 + C2) / 2
+    C_ave7 = C_ave**7
+    G = 0.5 * (1 - np.sqrt(C_ave7 / (C_ave7 + C_25_7)))
+
+    a1_, a2_ = (1 + G) * a1, (1 + G) * a2
+    b1_, b2_ = b1, b2
+
+    C1_ = np.sqrt(a1_**2 + b1_**2)
+    C2_ = np.sqrt(a2_**2 + b2_**2)
+
+    h1_ = np.arctan2(b1_, a1_)
+    h1_ = np.where(a1_ >= 0, h1_, h1_ + two_pi)
+    h1_ = np.where((b1_ == 0) & (a1_ == 0), 0, h1_)
+
+    h2_ = np.arctan2(b2_, a2_)
+    h2_ = np.where(a2_ >= 0, h2_, h2_ + two_pi)
+    h2_ = np.where((b2_ == 0) & (a2_ == 0), 0, h2_)
+
+    dL_ = L2 - L1
+    dC_ = C2_ - C1_
+    C1C2 = C1_ * C2_
+    dh_ = h2_ - h1_
+    dh_ = np.where(dh_ > np.pi, dh_ - two_pi, np.where(dh_ < -np.pi, dh_ + two_pi, dh_))
+    dh_ = np.where(C1C2 == 0, 0, dh_)
+    dH_ = 2 * np.sqrt(C1C2) * np.sin(dh_ / 2)
+
+    L_ave = (L1 + L2) / 2
+    C_ave = (C1_ + C2_) / 2
+
+    _dh = np.abs(h1_ - h2_)
+    _sh = h1_ + h2_
+    h_ave = np.where(_dh <= np.pi, _sh / 2, np.where(_sh < two_pi, _sh / 2 + np.pi, _sh / 2 - np.pi))
+    h_ave = np.where(C1C2 != 0, h_ave, _sh)
+
+    T = 1 - 0.17 * np.cos(h_ave - np.pi / 6) + 0.24 * np.cos(2 * h_ave) + 0.32 * np.cos(3 * h_ave + np.pi / 30) - 0.2 * np.cos(4 * h_ave - 63 * np.pi / 180)
+
+    h_ave_deg = h_ave * 180 / np.pi
+    h_ave_deg = np.where(h_ave_deg < 0, h_ave_deg + 360, np.where(h_ave_deg > 360, h_ave_deg - 360, h_ave_deg))
+    dTheta = 30 * np.exp(-(((h_ave_deg - 275) / 25)**2))
+
+    C_ave7 = C_ave**7
+    R_C = 2 * np.sqrt(C_ave7 / (C_ave7 + C_25_7))
+    S_C = 1 + 0.045 * C_ave
+    S_H = 1 + 0.015 * C_ave * T
+
+    Lm50s = (L_ave - 50)**2
+    S_L = 1 + 0.015 * Lm50s / np.sqrt(20 + Lm50s)
+    R_T = -np.sin(dTheta * np.pi / 90) * R_C
+
+    f_L = dL_ / S_L
+    f_C = dC_ / S_C
+    f_H = dH_ / S_H
+
+    return np.sqrt(f_L**2 + f_C**2 + f_H**2 + R_T * f_C * f_H)
@@ -6,6 +6,16 @@ from matplotlib.backend_bases import MouseEvent
 from colormath.color_objects import sRGBColor, LabColor
 from colormath.color_conversions import convert_color
 from cie2000 import CIEDE2000
+from analysis_cache import AnalysisCache, BackgroundAnalysis
+from image_io import read_image, to_rgb255
+from lab_array import read_palette, srgb_to_lab_array, lab_to_srgb_array, ita_array, nearest_tone, match_illuminants
+from calibration import load_calibration
+from tone_overlay import ProgressiveOverlay
+from roi_stats import polygon_mask, region_stats
+from matplotlib.widgets import PolygonSelector
+import os
+from results_writer import ResultsWriter
+import time
 
 import tkinter as tk
 from tkinter.filedialog import askopenfilename
@@ -311,23 +321,84 @@ def plot_L_vs_a_b(colors, names, input_rgb, title_prefix="Skin Tone Analysis"):
     plt.tight_layout()
     plt.show()
 
+CALIBRATION_FILE = "calibration.json"
+MATCH_ILLUMINANTS = ["d50", "d55", "d65", "d75", "a", "f2", "f11"]
+
 # Step 4: Function to load and display the image, and capture clicks
 def load_image_and_click(image_path, is_loreal=True):
-    img = plt.imread(image_path)
+    img = read_image(image_path)
+
+    palette_files = ["assets/skin_chart_loreal.csv", "assets/skin_chart_fitzpatrick.csv"]
+    # Session calibration written by calibration.py, applied to every conversion
+    calibration = load_calibration(CALIBRATION_FILE) if os.path.exists(CALIBRATION_FILE) else None
+    palette_names = [load_palette(f)[1] for f in palette_files]
+    cache = AnalysisCache()
+    # A cache miss is analyzed on a worker thread, so the window opens straight away
+    analysis = BackgroundAnalysis(image_path, img, palette_files, cache, calibration)
+    palette_labs = [srgb_to_lab_array(read_palette(f)[1]) for f in palette_files]
+    writer = ResultsWriter()
+    for x, y, *tones in cache.rois(analysis.key):
+        print(f"Previously clicked at: {x}, {y}, tones:", [names[t] for names, t in zip(palette_names, tones)])
+    for vertices, tones in cache.polygons(analysis.key):
+        print(f"Previous polygon ROI: {len(vertices)} vertices, tones:", [names[t] for names, t in zip(palette_names, tones)])
     
     fig, ax = plt.subplots()
     ax.imshow(img)
     ax.axis('off')  # Hide axes
+
+    def tone_maps():
+        # Per-palette shade rasters, or None while the analysis is still running
+        if not analysis.ready.is_set():
+            return None
+        return [analysis.arrays[f"tones_{i}"] for i in range(len(palette_files))]
+
+    def on_analysis_ready():
+        if not analysis.ready.is_set():
+            return
+        analysis_timer.stop()
+        overlay.set_analysis(tone_maps(), analysis.arrays["ita"])
+        for i, names in enumerate(palette_names):
+            counts = np.bincount(analysis.arrays[f"tones_{i}"].ravel(), minlength=len(names))
+            # A cache hit was already recorded when the analysis was computed
+            if analysis.fresh:
+                writer.append_histogram(image_path, writer.palette_names[i], names, counts)
+            top = np.argsort(counts)[::-1][:3]
+            print(f"Most frequent tones in {palette_files[i]}:", [(names[t], int(counts[t])) for t in top])
+
+    # Polled from the GUI thread, like the overlay tiles
+    analysis_timer = fig.canvas.new_timer(interval=200)
+    analysis_timer.add_callback(on_analysis_ready)
+    analysis_timer.start()
     
     def on_click(event: MouseEvent):
-        if event.inaxes != ax:
-            return  # Click was outside the image
+        if event.inaxes != ax or selector.active:
+            return  # Click was outside the image, or is drawing a polygon
         # Get the RGB value at the click position
         x, y = int(event.xdata), int(event.ydata)
-        rgb = img[y, x]  # img[y, x] gives the (R, G, B) value
-        rgb_int = tuple(int(v) for v in rgb[:3])
+        rgb_int = to_rgb255(img[y, x])  # img is float in [0, 1] whatever the file format
+        if calibration is not None:
+            rgb_int = tuple(int(round(v)) for v in lab_to_srgb_array(srgb_to_lab_array(rgb_int, calibration=calibration)))
+        rgb = rgb_int
 
         print(f"Clicked at: {x}, {y}, RGB: {rgb}")
+
+        start = time.perf_counter()
+        lab = srgb_to_lab_array(rgb_int)
+        matches = [nearest_tone(lab, palette_lab) for palette_lab in palette_labs]
+        writer.append_match(image_path, lab, [names[i[0]] for names, (i, d) in zip(palette_names, matches)],
+                            [d[0] for i, d in matches], float(ita_array(lab)), time.perf_counter() - start, x=x, y=y)
+
+        maps = tone_maps()
+        if maps is not None:
+            tones = [int(tone_map[y, x]) for tone_map in maps]
+        else:
+            tones = [int(i[0]) for i, d in matches]
+        cache.add_roi(analysis.key, x, y, tones)
+
+        for palette_file, names in zip(palette_files, palette_names):
+            index, distance = match_illuminants(rgb_int, read_palette(palette_file)[1], MATCH_ILLUMINANTS)
+            print(f"Closest tones per illuminant ({palette_file}):",
+                  ", ".join(f"{il.upper()} {names[i[0]]} ({d[0]:.1f})" for il, i, d in zip(MATCH_ILLUMINANTS, index, distance)))
         
         # Call the comparison plot function
         
@@ -351,6 +422,53 @@ def load_image_and_click(image_path, is_loreal=True):
 
     # Connect the click event to the handler
     fig.canvas.mpl_connect('button_press_event', on_click)
+    overlay = ProgressiveOverlay(ax, img, [(name, read_palette(f)[1]) for name, f in zip(writer.palette_names, palette_files)], calibration)
+
+    def on_polygon(vertices):
+        start = time.perf_counter()
+        mask = polygon_mask(img.shape, vertices)
+        stats = region_stats(img, mask, tone_maps(), palette_names, calibration, palette_labs)
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - start
+        L, a, b = stats["mean_lab"]
+        print(f"Polygon ROI: {stats['pixels']} pixels, mean Lab ({L:.1f}, {a:.1f}, {b:.1f}), "
+              f"median ITA {stats['median_ita']:.1f}°, {elapsed * 1000:.0f} ms")
+        tones = []
+        indices = []
+        delta_e = []
+        for palette_name, counts, palette_lab, names in zip(writer.palette_names, stats["tones"], palette_labs, palette_names):
+            top = sorted(counts.items(), key=lambda item: -item[1])[:3]
+            print(f"  {palette_name} tones:", [(name, count) for name, count in top if count])
+            index, distance = nearest_tone(stats["mean_lab"], palette_lab)
+            tones.append(names[index[0]])
+            indices.append(index[0])
+            delta_e.append(distance[0])
+        writer.append_match(image_path, stats["mean_lab"], tones, delta_e, stats["ita_of_mean"], elapsed,
+                            roi="polygon " + " ".join(f"{x:.0f},{y:.0f}" for x, y in vertices))
+        cache.add_polygon(analysis.key, vertices, indices)
+
+    selector = PolygonSelector(ax, on_polygon, useblit=True)
+    selector.set_active(False)
+
+    def on_key(event):
+        if event.key == 'd':  # start / stop drawing a polygon ROI ('r' is matplotlib's home view)
+            selector.clear()
+            selector.set_active(not selector.active)
+        elif event.key == 't':  # show / hide the tone overlay
+            overlay.toggle()
+        elif event.key == 'i':  # switch between nearest shade and ITA band
+            overlay.toggle_mode()
+        elif event.key == 'n':  # next palette
+            overlay.next_palette()
+
+    def on_close(event):
+        analysis_timer.stop()
+        overlay.cancel()
+        writer.close()
+
+    fig.canvas.mpl_connect('key_press_event', on_key)
+    fig.canvas.mpl_connect('close_event', on_close)
     
     plt.show()
 
@@ -0,0 +1,121 @@
+import numpy as np
+import os
+import sys
+from image_io import read_image
+from lab_array import srgb_to_lab_array, lab_to_srgb_array, nearest_tone
+from population import files
+
+# Derives a k-shade palette from population Lab data or image tone maps with
+# mini-batch k-means. Samples are assigned to shades by CIEDE2000; shades are
+# then moved towards the Lab mean of their assigned samples.
+
+MAX_BATCH_MB = 64
+N_BATCHES = 200
+
+
+def batch_size_for(k, max_bytes):
+    # Lab batch (float32) plus the (batch, k) Delta E matrix and its float64 temporaries
+    per_sample = 3 * 4 + k * 8 * 4
+    return max(k, int(max_bytes // per_sample))
+
+
+def population_batches(batch_size, rng, sources=None):
+    '''Endless random batches of Lab samples from Lab_*.csv files, both hand sides'''
+    sources = sources or [os.path.join("assets", f) for f in files[:-1]]
+    # Back hand in columns 0-2, front hand in 3-5, as in load_population
+    data = [np.loadtxt(path, delimiter=",", ndmin=2) for path in sources]
+    lab = np.concatenate([d[:, 0:3] for d in data] + [d[:, 3:6] for d in data])
+    while True:
+        yield lab[rng.integers(0, len(lab), min(batch_size, len(lab)))]
+
+
+def image_batches(image_paths, batch_size, rng):
+    '''Endless random batches of Lab pixels; only the sampled pixels are ever converted'''
+    while True:
+        for path in rng.permutation(image_paths):
+            pixels = read_image(path).reshape(-1, 3)
+            for _ in range(max(1, len(pixels) // batch_size // 4)):
+                sample = pixels[rng.integers(0, len(pixels), batch_size)]
+                yield srgb_to_lab_array(sample, scale=1.0, dtype=np.float32)
+
+
+def init_centers(batch, k, rng):
+    '''k-means++ seeding with CIEDE2000 distances'''
+    centers = [batch[rng.integers(len(batch))]]
+    for _ in range(1, k):
+        index, distance = nearest_tone(batch, np.array(centers))
+        weights = distance.astype(np.float64)**2
+        if weights.sum() == 0:
+            centers.append(batch[rng.integers(len(batch))])
+        else:
+            centers.append(batch[rng.choice(len(batch), p=weights / weights.sum())])
+    return np.array(centers, dtype=np.float64)
+
+
+def minibatch_kmeans(batches, k, n_batches=N_BATCHES, seed=0):
+    '''Fits k Lab centers from an iterator of (n, 3) Lab batches.
+
+    Returns the centers and the mean Delta E of the last batch to its shades.
+    '''
+    rng = np.random.default_rng(seed)
+    batch = next(batches)
+    centers = init_centers(batch, k, rng)
+    counts = np.zeros(k)
+
+    for _ in range(n_batches):
+        index, distance = nearest_tone(batch, centers, dtype=np.float32)
+        n = np.bincount(index, minlength=k)
+        sums = np.stack([np.bincount(index, weights=batch[:, c], minlength=k) for c in range(3)], axis=1)
+
+        # Per-center learning rate 1 / (samples seen so far)
+        counts += n
+        seen = n > 0
+        centers[seen] += (sums[seen] - n[seen, None] * centers[seen]) / counts[seen, None]
+
+        # Shades that never won a sample are moved to the worst-matched samples
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centers[empty] = batch[np.argsort(distance)[::-1][:len(empty)]]
+
+        batch = next(batches)
+    return centers, float(distance.mean())
+
+
+def write_palette(namefile, centers, illuminant="d65"):
+    '''Writes shades lightest first in the name,R,G,B format read by load_palette.
+
+    illuminant is the white point of the Lab centers: d50 for the population
+    data, d65 for the image tone maps.
+    '''
+    centers = centers[np.argsort(-centers[:, 0])]
+    rgb = lab_to_srgb_array(centers, illuminant=illuminant)
+    with open(namefile, "w") as f:
+        for i, (r, g, b) in enumerate(rgb):
+            f.write(f"K{i + 1},{int(round(r))},{int(round(g))},{int(round(b))}\n")
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) >= 3:
+        k = int(argv[1])
+        output = argv[2]
+        inputs = argv[3:]
+        rng = np.random.default_rng(0)
+        batch_size = batch_size_for(k, MAX_BATCH_MB * 2**20)
+        images = [p for p in inputs if not p.lower().endswith(".csv")]
+        csvs = [p for p in inputs if p.lower().endswith(".csv")]
+        if images and csvs:
+            print("Pass either population csv files or images, not both")
+            sys.exit(2)
+        if images:
+            batches = image_batches(images, batch_size, rng)
+            illuminant = "d65"
+        else:
+            # The population measurements are D50 Lab
+            batches = population_batches(batch_size, rng, csvs)
+            illuminant = "d50"
+        centers, mean_de = minibatch_kmeans(batches, k)
+        write_palette(output, centers, illuminant)
+        print(f"{k} shades written to {output} (mean Delta E {mean_de:.2f})")
+    else:
+        print("Usage: python derive_palette.py <k> <output.csv> [Lab_*.csv ... | image ...]")
@@ -0,0 +1,127 @@
+import numpy as np
+import sys
+from lab_array import read_palette, srgb_to_lab_array, ita_array, nearest_tone
+from population import files, names, palettes, load_population
+
+ITA_EDGES = np.arange(-90, 91, 5)
+SIDES = ["Back hand", "Front hand"]
+
+
+class GroupStats:
+    '''Running per-group and per-hand-side Lab statistics.
+
+    Counts, means and covariances are merged batch by batch (Chan et al.),
+    ITA histograms and tone-assignment counts are summed, so adding new
+    measurements never rescans the history.
+    '''
+
+    def __init__(self):
+        self.palette_names = {}
+        self.palette_lab = {}
+        for palette_name, namefile in palettes.items():
+            tone_names, colors = read_palette(namefile)
+            self.palette_names[palette_name] = tone_names
+            self.palette_lab[palette_name] = srgb_to_lab_array(colors)
+        self.groups = {}
+
+    def _empty(self):
+        state = {
+            "n": np.zeros(1),
+            "mean": np.zeros(3),
+            "m2": np.zeros((3, 3)),
+            "ita_hist": np.zeros(len(ITA_EDGES) - 1, dtype=np.int64),
+        }
+        for palette_name, tone_names in self.palette_names.items():
+            state["tones:" + palette_name] = np.zeros(len(tone_names), dtype=np.int64)
+        return state
+
+    def update(self, group, side, lab):
+        '''Adds an (N, 3) batch of Lab measurements to a group / hand side'''
+        lab = np.asarray(lab, dtype=np.float64).reshape(-1, 3)
+        if len(lab) == 0:
+            return
+        state = self.groups.setdefault((group, side), self._empty())
+
+        n_b = len(lab)
+        mean_b = lab.mean(axis=0)
+        centered = lab - mean_b
+        m2_b = centered.T @ centered
+
+        n_a = state["n"][0]
+        n = n_a + n_b
+        delta = mean_b - state["mean"]
+        state["mean"] += delta * n_b / n
+        state["m2"] += m2_b + np.outer(delta, delta) * n_a * n_b / n
+        state["n"][0] = n
+
+        state["ita_hist"] += np.histogram(np.clip(ita_array(lab), -90, 90), bins=ITA_EDGES)[0]
+        for palette_name, palette_lab in self.palette_lab.items():
+            index, distance = nearest_tone(lab, palette_lab)
+            state["tones:" + palette_name] += np.bincount(index, minlength=len(palette_lab))
+
+    def count(self, group, side):
+        return int(self.groups[(group, side)]["n"][0])
+
+    def mean(self, group, side):
+        return self.groups[(group, side)]["mean"].copy()
+
+    def covariance(self, group, side):
+        state = self.groups[(group, side)]
+        n = state["n"][0]
+        return state["m2"] / (n - 1) if n > 1 else np.zeros((3, 3))
+
+    def ita_histogram(self, group, side):
+        return ITA_EDGES, self.groups[(group, side)]["ita_hist"].copy()
+
+    def tone_counts(self, group, side, palette_name):
+        '''{tone name: count} in palette order'''
+        counts = self.groups[(group, side)]["tones:" + palette_name]
+        return dict(zip(self.palette_names[palette_name], counts.tolist()))
+
+    def save(self, namefile):
+        arrays = {}
+        for (group, side), state in self.groups.items():
+            for key, value in state.items():
+                arrays[f"{group}|{side}|{key}"] = value
+        np.savez(namefile, **arrays)
+
+    @classmethod
+    def load(cls, namefile):
+        stats = cls()
+        with np.load(namefile) as data:
+            for name in data.files:
+                group, side, key = name.split("|", 2)
+                state = stats.groups.setdefault((group, side), stats._empty())
+                if key in state:
+                    state[key] = data[name].copy()
+        return stats
+
+
+def from_population():
+    '''Statistics for every assets/Lab_*.csv group and hand side'''
+    stats = GroupStats()
+    for filename, name in zip(files, names):
+        for back, side in zip((True, False), SIDES):
+            stats.update(name, side, load_population(filename, back))
+    return stats
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) == 2:
+        stats = from_population()
+        stats.save(argv[1])
+    elif len(argv) == 4:
+        # Add a new measurements csv (L,a,b back hand, L,a,b front hand) to a group
+        stats = GroupStats.load(argv[1])
+        data = np.loadtxt(argv[3], delimiter=",", ndmin=2)
+        stats.update(argv[2], SIDES[0], data[:, 0:3])
+        stats.update(argv[2], SIDES[1], data[:, 3:6])
+        stats.save(argv[1])
+    else:
+        print("Usage: python group_stats.py <state.npz> [<group> <measurements.csv>]")
+        sys.exit()
+
+    for group, side in stats.groups:
+        L, a, b = stats.mean(group, side)
+        print(f"{group:26s} {side:10s} N={stats.count(group, side):4d}  L*={L:5.1f} a*={a:5.1f} b*={b:5.1f}")
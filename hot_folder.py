@@ -0,0 +1,165 @@
+import numpy as np
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from image_io import read_image
+from lab_array import read_palette, srgb_to_lab_array, ita_array, nearest_tone
+from palette_index import PaletteIndex
+from population import palettes
+from results_writer import ResultsWriter
+
+# Watches a capture directory and processes every new photo once its write has
+# finished: skin mask, skin ROI Lab / ITA and nearest shades, appended to the
+# results store. Discovery feeds a bounded queue, so a burst of captures only
+# waits on disk rather than piling up decoded images in memory.
+
+EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+POLL_SECONDS = 1.0
+STABLE_POLLS = 2
+QUEUE_SIZE = 8
+STATS_SECONDS = 10.0
+
+
+def skin_mask(img):
+    '''Boolean skin mask from the classic YCbCr box (Chai & Ngan) on a [0, 1] RGB image'''
+    r, g, b = img[..., 0], img[..., 1], img[..., 2]
+    cb = 128 + 255 * (-0.168736 * r - 0.331264 * g + 0.5 * b)
+    cr = 128 + 255 * (0.5 * r - 0.418688 * g - 0.081312 * b)
+    return (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+
+
+def process_file(path):
+    '''Runs in a worker process; returns the skin ROI match and tone histograms'''
+    start = time.perf_counter()
+    img = read_image(path)
+    mask = skin_mask(img)
+    if not mask.any():
+        return {"path": path, "pixels": 0, "elapsed": time.perf_counter() - start}
+    lab = srgb_to_lab_array(img[mask], scale=1.0, dtype=np.float32)
+    median = np.median(lab, axis=0)
+
+    result = {"path": path, "pixels": int(mask.sum()), "lab": median, "ita": float(ita_array(median)),
+              "tones": [], "delta_e": [], "histograms": []}
+    for palette_name, namefile in palettes.items():
+        names, colors = read_palette(namefile)
+        palette_lab = srgb_to_lab_array(colors)
+        index, distance = nearest_tone(median, palette_lab)
+        result["tones"].append(names[index[0]])
+        result["delta_e"].append(float(distance[0]))
+        pixel_index, pixel_distance = PaletteIndex(palette_lab).query(lab, dtype=np.float32)
+        result["histograms"].append((palette_name, names, np.bincount(pixel_index, minlength=len(names))))
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+class HotFolder:
+
+    def __init__(self, directory, workers=2, writer=None):
+        self.directory = directory
+        self.workers = workers
+        self.writer = writer or ResultsWriter(palette_names=list(palettes))
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.seen = set()
+        self.pending = {}
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=100)
+
+    def _ready_files(self):
+        '''New files whose size and mtime held still for STABLE_POLLS polls'''
+        ready = []
+        names = sorted(os.listdir(self.directory))
+        # Forget files deleted or renamed away before they settled
+        present = {os.path.join(self.directory, name) for name in names}
+        for path in [path for path in self.pending if path not in present]:
+            del self.pending[path]
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if path in self.seen or not name.lower().endswith(EXTENSIONS):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self.pending.pop(path, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous, polls, detected = self.pending.get(path, (None, 0, time.monotonic()))
+            polls = polls + 1 if signature == previous and stat.st_size > 0 else 0
+            self.pending[path] = (signature, polls, detected)
+            if polls >= STABLE_POLLS:
+                ready.append(path)
+        return ready
+
+    async def watch(self):
+        while True:
+            for path in self._ready_files():
+                # Blocks while the queue is full: backpressure onto the directory scan
+                await self.queue.put((path, self.pending.pop(path)[2]))
+                self.seen.add(path)
+            await asyncio.sleep(POLL_SECONDS)
+
+    async def work(self, pool):
+        loop = asyncio.get_running_loop()
+        while True:
+            path, detected = await self.queue.get()
+            self.in_flight += 1
+            try:
+                result = await loop.run_in_executor(pool, process_file, path)
+                self.record(result)
+            except Exception as error:
+                print(f"Failed to process {path}: {error}")
+                self.failed += 1
+            else:
+                self.processed += 1
+                self.latencies.append(time.monotonic() - detected)
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    def record(self, result):
+        if result["pixels"] == 0:
+            print(f"No skin found in {result['path']}")
+            return
+        self.writer.append_match(result["path"], result["lab"], result["tones"], result["delta_e"],
+                                 result["ita"], result["elapsed"], roi="skin")
+        for palette_name, names, counts in result["histograms"]:
+            self.writer.append_histogram(result["path"], palette_name, names, counts)
+        print(f"{os.path.basename(result['path'])}: " + ", ".join(f"{p} {t}" for p, t in zip(self.writer.palette_names, result["tones"])))
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {"queued": self.queue.qsize(), "waiting_on_disk": len(self.pending), "in_flight": self.in_flight,
+                "processed": self.processed, "failed": self.failed, "latency_mean_s": float(latencies.mean()),
+                "latency_p95_s": float(np.percentile(latencies, 95))}
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(STATS_SECONDS)
+            print("Hot folder:", ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in self.stats().items()))
+
+    async def run(self):
+        with ProcessPoolExecutor(self.workers) as pool:
+            tasks = [asyncio.create_task(self.watch()), asyncio.create_task(self.report())]
+            tasks += [asyncio.create_task(self.work(pool)) for _ in range(self.workers)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                self.writer.close()
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) in (2, 3):
+        workers = int(argv[2]) if len(argv) == 3 else max(1, os.cpu_count() - 1)
+        try:
+            asyncio.run(HotFolder(argv[1], workers).run())
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("Usage: python hot_folder.py <directory> [workers]")
@@ -0,0 +1,79 @@
+import numpy as np
+import re
+from collections import Counter
+from PIL import Image
+
+# Single entry point for image inputs. Whatever the file holds (8/16-bit,
+# grey, palette, RGB/RGBA, float), callers get an (H, W, 3) C-contiguous
+# float32 array of sRGB values in [0, 1]. Arrays that already have that layout
+# are passed through untouched; every other case makes exactly one copy, which
+# is recorded in copy_counts by reason.
+
+copy_counts = Counter()
+
+
+def _as_float(pixels, scale, reason):
+    copy_counts[reason] += 1
+    out = np.empty(pixels.shape[:2] + (3,), dtype=np.float32)
+    # Scaling writes straight into the output: no intermediate float64 array
+    np.multiply(pixels, np.float32(1.0 / scale), out=out, casting="unsafe")
+    return out
+
+
+def normalize_image(pixels, scale=None):
+    '''(H, W, 3) float32 [0, 1] view or single copy of an (H, W), (H, W, 3) or (H, W, 4) array.
+
+    Integer data is divided by scale, by default the largest value of its dtype.
+    '''
+    pixels = np.asarray(pixels)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    if pixels.shape[2] == 1 or pixels.shape[2] == 2:
+        # Grey (+ alpha): broadcast the single channel to RGB during the copy
+        pixels = np.broadcast_to(pixels[:, :, :1], pixels.shape[:2] + (3,))
+    else:
+        pixels = pixels[:, :, :3]
+
+    if pixels.dtype.kind == "f":
+        if pixels.dtype == np.float32 and pixels.flags.c_contiguous:
+            return pixels
+        return _as_float(pixels, 1.0, f"{pixels.dtype} -> float32")
+    if pixels.dtype.kind in "ui":
+        return _as_float(pixels, scale or np.iinfo(pixels.dtype).max, f"{pixels.dtype} -> float32")
+    if pixels.dtype == np.bool_:
+        return _as_float(pixels, 1.0, "bool -> float32")
+    raise ValueError(f"Unsupported image dtype {pixels.dtype}")
+
+
+def _declared_bits(im):
+    '''Bits per sample an "I" mode file declares: TIFF BitsPerSample, else the decoder's raw mode'''
+    bits = getattr(im, "tag_v2", {}).get(258)
+    if bits:
+        return int(bits[0] if isinstance(bits, tuple) else bits)
+    for tile in im.tile:
+        args = tile[3]
+        match = re.match(r"I;(\d+)", args[0] if isinstance(args, tuple) else args)
+        if match:
+            return int(match.group(1))
+    return 32
+
+
+def read_image(path):
+    '''Decodes a JPEG/PNG/TIFF file into the (H, W, 3) float32 [0, 1] layout'''
+    with Image.open(path) as im:
+        if im.mode in ("P", "PA", "CMYK", "YCbCr", "LAB", "HSV", "1"):
+            im = im.convert("RGBA" if "transparency" in im.info or im.mode == "PA" else "RGB")
+        if im.mode.startswith("I;16"):
+            pixels = np.asarray(im).astype(np.uint16, copy=False)
+        elif im.mode == "I":
+            # PIL widens every integer depth to 32 bits: scale by the one the file declares
+            bits = _declared_bits(im)
+            return normalize_image(np.asarray(im), scale=2**min(bits, 31) - 1)
+        else:
+            pixels = np.asarray(im)
+    return normalize_image(pixels)
+
+
+def to_rgb255(rgb):
+    '''Integer 0-255 tuple for a pixel of a normalized image, as the palette code expects'''
+    return tuple(int(round(float(v) * 255)) for v in rgb[:3])
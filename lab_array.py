@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from colormath.color_constants import ILLUMINANTS, ADAPTATION_MATRICES
+from cie2000 import CIEDE2000_array
+
+# sRGB (D65) constants, identical to the ones colormath uses in rgb_to_lab
+SRGB_TO_XYZ = np.array([[0.412424, 0.357579, 0.180464],
+                        [0.212656, 0.715158, 0.0721856],
+                        [0.0193324, 0.119193, 0.950444]])
+XYZ_TO_SRGB = np.array([[3.24071, -1.53726, -0.498571],
+                        [-0.969258, 1.87599, 0.0415557],
+                        [0.0556352, -0.203996, 1.05707]])
+D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+CIE_E = 216.0 / 24389.0
+
+
+def read_palette(namefile):
+    '''Reads a name,R,G,B palette csv into (names, (P, 3) float RGB array)'''
+    palette_df = pd.read_csv(namefile, header=None, names=["color","R","G","B"])
+    colors = palette_df[["R","G","B"]].to_numpy(dtype=np.float64)
+    names = palette_df["color"].tolist()
+    return names, colors
+
+
+def srgb_to_linear(V):
+    return np.where(V <= 0.04045, V / 12.92, ((V + 0.055) / 1.055)**2.4)
+
+
+@lru_cache(maxsize=None)
+def _bradford(target_illuminant, source_illuminant):
+    if target_illuminant == source_illuminant:
+        matrix = np.eye(3)
+    else:
+        # Scale the sharpened cone responses by the ratio of the two white points
+        m_sharp = ADAPTATION_MATRICES["bradford"]
+        rgb_src = m_sharp @ np.array(ILLUMINANTS["2"][source_illuminant])
+        rgb_dst = m_sharp @ np.array(ILLUMINANTS["2"][target_illuminant])
+        matrix = np.linalg.inv(m_sharp) @ np.diag(rgb_dst / rgb_src) @ m_sharp
+    matrix.flags.writeable = False
+    return matrix
+
+
+def adaptation_matrix(target_illuminant, source_illuminant="d65"):
+    '''Bradford XYZ adaptation between two colormath illuminants (2° observer), cached'''
+    return _bradford(target_illuminant.lower(), source_illuminant.lower())
+
+
+def srgb_to_lab_array(rgb, scale=255.0, dtype=np.float64, chunk=1 << 20, calibration=None):
+    '''Converts (..., 3) sRGB values in [0, scale] to D65 Lab, matching rgb_to_lab.
+
+    An optional calibration (see calibration.py) is folded into the linear RGB
+    step: its tone curve is applied per chunk and its matrix is premultiplied
+    into the RGB -> XYZ matrix, so it costs no extra pass over the image.
+    '''
+    return srgb_to_lab_multi(rgb, ("d65",), scale, dtype, chunk, calibration)[0]
+
+
+def srgb_to_lab_multi(rgb, illuminants, scale=255.0, dtype=np.float64, chunk=1 << 20, calibration=None):
+    '''(len(illuminants), ..., 3) Lab values of sRGB input under each target illuminant.
+
+    Decoding and linearization are done once per chunk; each illuminant then
+    only costs one 3x3 product with its cached RGB -> adapted XYZ matrix. Matches
+    convert_color(srgb, LabColor, target_illuminant=...).
+    '''
+    rgb = np.asarray(rgb)
+    shape = rgb.shape
+    flat = rgb.reshape(-1, 3)
+    rgb_to_xyz = SRGB_TO_XYZ
+    gamma = None
+    if calibration is not None:
+        rgb_to_xyz = SRGB_TO_XYZ @ np.asarray(calibration["matrix"])
+        if calibration.get("gamma") is not None:
+            gamma = np.asarray(calibration["gamma"], dtype=dtype)
+    matrices = []
+    for illuminant in illuminants:
+        white = np.array(ILLUMINANTS["2"][illuminant.lower()])
+        matrices.append(((adaptation_matrix(illuminant) @ rgb_to_xyz) / white[:, None]).T.astype(dtype))
+    out = np.empty((len(matrices),) + flat.shape, dtype=dtype)
+
+    # Work in chunks so the float temporaries stay bounded on large images
+    for start in range(0, len(flat), chunk):
+        V = flat[start:start + chunk].astype(dtype)
+        V /= scale
+        lin = srgb_to_linear(V)
+        if gamma is not None:
+            np.power(np.maximum(lin, 0, out=lin), gamma, out=lin)
+        for k, matrix in enumerate(matrices):
+            t = lin @ matrix
+            f = np.where(t > CIE_E, np.cbrt(t), 7.787 * t + 16.0 / 116.0)
+            block = out[k, start:start + chunk]
+            block[:, 0] = 116.0 * f[:, 1] - 16.0
+            block[:, 1] = 500.0 * (f[:, 0] - f[:, 1])
+            block[:, 2] = 200.0 * (f[:, 1] - f[:, 2])
+    return out.reshape((len(matrices),) + shape)
+
+
+def match_illuminants(rgb, palette_colors, illuminants, scale=255.0, dtype=np.float64):
+    '''Nearest palette shade of each sRGB sample under each illuminant.
+
+    Samples and palette are converted in one batched pass each; returns
+    (len(illuminants), N) indices and distances.
+    '''
+    lab = srgb_to_lab_multi(rgb, illuminants, scale, dtype).reshape(len(illuminants), -1, 3)
+    palette_lab = srgb_to_lab_multi(palette_colors, illuminants, dtype=dtype)
+    index = np.empty(lab.shape[:2], dtype=np.intp)
+    distance = np.empty(lab.shape[:2], dtype=dtype)
+    for k in range(len(illuminants)):
+        index[k], distance[k] = nearest_tone(lab[k], palette_lab[k], dtype=dtype)
+    return index, distance
+
+
+def lab_to_srgb_array(lab, scale=255.0, illuminant="d65"):
+    '''Converts (..., 3) Lab values back to sRGB in [0, scale], clipping out-of-gamut values.
+
+    illuminant is the reference white of the Lab values; anything other than D65
+    is Bradford-adapted first, like convert_color(LabColor(..., illuminant=...), sRGBColor)
+    (LabColor defaults to D50).
+    '''
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16.0) / 116.0
+    f = np.stack([fy + lab[..., 1] / 500.0, fy, fy - lab[..., 2] / 200.0], axis=-1)
+    t = np.where(f**3 > CIE_E, f**3, (f - 16.0 / 116.0) / 7.787)
+    white = np.array(ILLUMINANTS["2"][illuminant.lower()])
+    lin = (t * white) @ (XYZ_TO_SRGB @ adaptation_matrix("d65", illuminant)).T
+    V = np.where(lin <= 0.0031308, 12.92 * lin, 1.055 * np.abs(lin)**(1 / 2.4) - 0.055)
+    return np.clip(V, 0, 1) * scale
+
+
+def ita_array(lab):
+    '''Individual Typology Angle in degrees for (..., 3) Lab values'''
+    lab = np.asarray(lab)
+    return np.degrees(np.arctan2(lab[..., 0] - 50, lab[..., 2]))
+
+
+def delta_e_matrix(lab, palette_lab, dtype=np.float64):
+    '''(N, P) CIEDE2000 distances between N Lab samples and P palette shades'''
+    lab = np.asarray(lab, dtype=dtype).reshape(-1, 3)
+    palette_lab = np.asarray(palette_lab, dtype=dtype)
+    return CIEDE2000_array(lab[:, None, :], palette_lab[None, :, :], dtype=dtype)
+
+
+def nearest_tone(lab, palette_lab, dtype=np.float64, max_elements=1 << 20):
+    '''Index of and distance to the closest palette shade for each Lab sample.
+
+    Ties resolve to the first shade in palette order, like closest_color_in_palette.
+    Samples are processed in chunks of at most max_elements sample/shade pairs.
+    '''
+    lab = np.asarray(lab).reshape(-1, 3)
+    chunk = max(1, max_elements // len(palette_lab))
+    index = np.empty(len(lab), dtype=np.intp)
+    distance = np.empty(len(lab), dtype=dtype)
+    for start in range(0, len(lab), chunk):
+        dist = delta_e_matrix(lab[start:start + chunk], palette_lab, dtype=dtype)
+        best = np.argmin(dist, axis=1)
+        index[start:start + chunk] = best
+        distance[start:start + chunk] = dist[np.arange(len(best)), best]
+    return index, distance
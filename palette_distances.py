@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import os
+import sys
+from multiprocessing import Pool
+from lab_array import read_palette, srgb_to_lab_array, delta_e_matrix
+from population import files, names, palettes, load_population
+
+# Sample x palette CIEDE2000 matrices for every population file and hand side,
+# with the rows split into chunks that are spread over a process pool.
+
+CHUNK = 4096
+
+
+def distance_chunk(task):
+    filename, back, palette_name, start = task
+    lab = load_population(filename, back)[start:start + CHUNK]
+    tone_names, colors = read_palette(palettes[palette_name])
+    return delta_e_matrix(lab, srgb_to_lab_array(colors))
+
+
+def population_distances(processes=None):
+    '''Returns {(group, side, palette): (N, P) Delta E matrix} for all population files'''
+    keys = []
+    tasks = []
+    for filename, name in zip(files, names):
+        n = len(load_population(filename))
+        for back in (True, False):
+            for palette_name in palettes:
+                keys.append((name, "Back hand" if back else "Front hand", palette_name))
+                tasks.append([(filename, back, palette_name, start) for start in range(0, n, CHUNK)])
+
+    with Pool(processes) as pool:
+        chunks = pool.map(distance_chunk, [t for group in tasks for t in group])
+
+    matrices = {}
+    for key, group in zip(keys, tasks):
+        matrices[key] = np.concatenate(chunks[:len(group)])
+        chunks = chunks[len(group):]
+    return matrices
+
+
+def assignment_table(matrices, palette_name):
+    '''Counts of nearest-tone assignments per group and hand side, tones in palette order'''
+    tone_names, colors = read_palette(palettes[palette_name])
+    rows = {}
+    for (group, side, name), dist in matrices.items():
+        if name == palette_name:
+            counts = np.bincount(np.argmin(dist, axis=1), minlength=len(tone_names))
+            rows[(group, side)] = counts
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=tone_names)
+    table.index = pd.MultiIndex.from_tuples(table.index, names=["group", "side"])
+    # Keep the table compact: drop shades nobody was assigned to
+    return table.loc[:, table.sum(axis=0) > 0]
+
+
+def save_matrices(matrices, namefile):
+    arrays = {}
+    for (group, side, palette_name), dist in matrices.items():
+        arrays[f"{group}|{side}|{palette_name}"] = dist
+    np.savez_compressed(namefile, **arrays)
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) <= 3:
+        processes = int(argv[1]) if len(argv) >= 2 else os.cpu_count()
+        matrices = population_distances(processes)
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            for palette_name in palettes:
+                print(f"Closest {palette_name} tone counts")
+                print(assignment_table(matrices, palette_name))
+                print()
+        if len(argv) == 3:
+            save_matrices(matrices, argv[2])
+            print("Distance matrices saved to", argv[2])
+    else:
+        print("Usage: python palette_distances.py [processes] [matrices.npz]")
@@ -0,0 +1,258 @@
+import numpy as np
+import os
+import sys
+import time
+from cie2000 import CIEDE2000_array
+from lab_array import read_palette, srgb_to_lab_array, nearest_tone
+
+# Nearest-shade search over large palettes, exact under a lower bound on CIEDE2000:
+#
+#   DE00^2 = f_L^2 + f_C^2 + f_H^2 + R_T f_C f_H   with |R_T| <= sin(60°) R_C < 2
+#
+# so DE00^2 >= f_L^2 + (1 - sin(60°) R_C / 2)(f_C^2 + f_H^2). As S_H <= S_C,
+# f_C^2 + f_H^2 >= (dC'^2 + dH'^2) / S_C^2 = |d(a', b)|^2 / S_C^2 >= |d(a, b)|^2 / S_C^2,
+# and f_L = dL / S_L. Taking S_L at the L* farthest from 50 and S_C, R_C at the
+# largest chroma a pair can have gives DE00 >= |(w_L dL, w_ab da, w_ab db)|.
+#
+# Shades are bucketed in a grid of (L*, a*, b*) cells and only the cells around
+# a sample are scanned, nearest first, until the bound rules out everything
+# further away. Samples still unresolved after MAX_RING rings, and all samples
+# of palettes too small for the grid to pay off, go through L* bands instead,
+# where whole bands are skipped on DE00 >= |dL| / S_L alone.
+
+SIN_60 = np.sin(np.pi / 3)
+GRID_SHADES = 3000
+CELL_SHADES = 2
+MAX_RING = 4
+MAX_PAIRS = 1 << 20
+
+
+def S_L(L_ave):
+    Lm50s = (np.asarray(L_ave) - 50)**2
+    return 1 + 0.015 * Lm50s / np.sqrt(20 + Lm50s)
+
+
+def R_C(C_ave):
+    C_ave7 = np.asarray(C_ave)**7
+    return 2 * np.sqrt(C_ave7 / (C_ave7 + 25.0**7))
+
+
+def L_weight(L_lo, L_hi):
+    '''w_L = 1 / S_L for mean L* anywhere in [L_lo, L_hi]'''
+    return 1 / S_L(np.maximum(np.abs(L_lo - 50), np.abs(L_hi - 50)) + 50)
+
+
+def ab_weight(C_ave):
+    '''w_ab for mean chroma up to C_ave; decreasing in C_ave'''
+    # C' = (1 + G) C, increasing in C
+    C_ave = C_ave * (1.5 - R_C(C_ave) / 4)
+    return np.sqrt(1 - SIN_60 * R_C(C_ave) / 2) / (1 + 0.045 * C_ave)
+
+
+def merge_palettes(namefiles):
+    '''One catalogue out of several name,R,G,B palettes, names prefixed by their file'''
+    all_names = []
+    all_colors = []
+    for namefile in namefiles:
+        names, colors = read_palette(namefile)
+        prefix = os.path.splitext(os.path.basename(namefile))[0]
+        all_names += [f"{prefix}:{name}" for name in names]
+        all_colors.append(colors)
+    return all_names, np.concatenate(all_colors)
+
+
+def _cell_keys(cells):
+    '''One int64 per integer (L, a, b) cell coordinate'''
+    cells = cells + (1 << 19)
+    return (cells[..., 0] << 40) | (cells[..., 1] << 20) | cells[..., 2]
+
+
+class PaletteIndex:
+    '''Grid / L*-band index returning exactly the shade nearest_tone would pick.
+
+    Ties resolve to the lowest palette index, as in the brute-force scan. Grid
+    cells are stretched along a*, b* like the bound and sized for about
+    CELL_SHADES shades each, so the shades scanned per sample stay roughly
+    constant as the palette grows.
+    '''
+
+    def __init__(self, palette_lab, band_width=2.0, cell_size=None):
+        self.palette_lab = np.asarray(palette_lab, dtype=np.float64)
+        L = self.palette_lab[:, 0]
+        chroma = np.hypot(self.palette_lab[:, 1], self.palette_lab[:, 2])
+        self.L_range = (L.min(), L.max())
+        self.max_chroma = chroma.max()
+
+        self.band_width = band_width
+        band = np.floor(L / band_width).astype(np.int64)
+        self.bands = []
+        for b in np.unique(band):
+            members = np.flatnonzero(band == b)
+            self.bands.append((members, self.palette_lab[members], L[members].min(), L[members].max()))
+
+        self.keys = None
+        if len(self.palette_lab) < GRID_SHADES:
+            return
+        self.weights = np.array([L_weight(*self.L_range), ab_weight(np.median(chroma))])[[0, 1, 1]]
+        aspect = self.weights[0] / self.weights
+        if cell_size is None:
+            cell_size = np.ptp(self.palette_lab / aspect, axis=0).max() + 1.0
+            # Shrink until the occupied cells hold CELL_SHADES shades on average
+            while cell_size > 0.05:
+                cells = np.floor(self.palette_lab / (cell_size * aspect)).astype(np.int64)
+                if len(self.palette_lab) <= CELL_SHADES * len(np.unique(_cell_keys(cells))):
+                    break
+                cell_size /= 2**(1 / 3)
+        self.cell = cell_size * aspect
+
+        keys = _cell_keys(np.floor(self.palette_lab / self.cell).astype(np.int64))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys, self.start, self.count = np.unique(keys[self.order], return_index=True, return_counts=True)
+        # Extent of the shades actually in each cell, tighter than the cell itself
+        self.lo = np.minimum.reduceat(self.palette_lab[self.order], self.start)
+        self.hi = np.maximum.reduceat(self.palette_lab[self.order], self.start)
+
+        # Neighbouring cells, nearest first: offset o is at least max(|o| - 1, 0)
+        # cells away along each axis
+        r = np.arange(-MAX_RING, MAX_RING + 1)
+        offsets = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+        gaps = np.maximum(np.abs(offsets) - 1, 0) * self.cell
+        bounds = np.hypot.reduce(gaps * self.weights, axis=1)
+        # Shades outside the cube are MAX_RING cells away along some axis, so
+        # corners further than that settle nothing the outer shell would not
+        self.shell = MAX_RING * (self.cell * self.weights).min()
+        ranked = np.argsort(bounds, kind="stable")
+        ranked = ranked[bounds[ranked] < self.shell]
+        self.offsets = offsets[ranked]
+        self.bounds = bounds[ranked]
+
+    def query(self, lab, dtype=np.float64):
+        '''Index of and distance to the nearest shade for each of the (N, 3) Lab samples'''
+        lab = np.asarray(lab, dtype=np.float64).reshape(-1, 3)
+        best = np.full(len(lab), np.inf, dtype=dtype)
+        best_index = np.full(len(lab), len(self.palette_lab), dtype=np.intp)
+        rows = np.arange(len(lab))
+        if self.keys is not None and len(lab):
+            rows = self._grid(lab, best, best_index, dtype)
+        self._banded(lab, rows, best, best_index, dtype)
+        return best_index, best
+
+    def _grid(self, lab, best, best_index, dtype):
+        '''Ring search around each sample; returns the samples it could not settle'''
+        L = lab[:, 0]
+        chroma = np.hypot(lab[:, 1], lab[:, 2])
+        w_L = L_weight((L + self.L_range[0]) / 2, (L + self.L_range[1]) / 2)
+        # Any shade in the rings is within reach in a*, b*, which caps the pair's mean chroma
+        reach = np.sqrt(2) * (MAX_RING + 1) * self.cell[1]
+        w_ab = ab_weight(np.minimum(chroma + reach / 2, (chroma + self.max_chroma) / 2))
+        # Per-sample bounds are at least scale times the reference ones the rings are ranked by
+        scale = np.minimum(w_L / self.weights[0], w_ab / self.weights[1])
+        weights = np.column_stack([w_L, w_ab, w_ab])
+        cells = np.floor(lab / self.cell).astype(np.int64)
+
+        # Shades beyond the cube are MAX_RING cells away along some axis, at any chroma
+        beyond = MAX_RING * np.minimum(self.cell[0] * w_L, self.cell[1] * ab_weight((chroma + self.max_chroma) / 2))
+
+        active = np.arange(len(lab))
+        unresolved = []
+        for offset, bound in zip(self.offsets, self.bounds):
+            # Small slack so rounding (float32 distances included) never prunes a tie
+            slack = best[active] * (1 + 1e-4) + 1e-4
+            done = slack < scale[active] * bound
+            # Settled by the rings, but a shade beyond the cube may still be closer
+            unresolved.append(active[done & (slack >= beyond[active])])
+            active = active[~done]
+            if len(active) == 0:
+                break
+            keys = _cell_keys(cells[active] + offset)
+            pos = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+            hit = self.keys[pos] == keys
+            self._scan(lab, weights, active[hit], pos[hit], best, best_index, dtype)
+
+        # The rings left out are at least shell away, scaled like the others
+        slack = best[active] * (1 + 1e-4) + 1e-4
+        unresolved.append(active[slack >= np.minimum(scale[active] * self.shell, beyond[active])])
+        return np.sort(np.concatenate(unresolved))
+
+    def _scan(self, lab, weights, rows, cells, best, best_index, dtype):
+        '''Updates best / best_index of each sample in rows with the shades of its cell'''
+        # Skip cells whose shades are all further than the sample's current best
+        gap = np.maximum(0.0, np.maximum(self.lo[cells] - lab[rows], lab[rows] - self.hi[cells]))
+        near = np.hypot.reduce(gap * weights[rows], axis=1) <= best[rows] * (1 + 1e-4) + 1e-4
+        rows, cells = rows[near], cells[near]
+        if len(rows) == 0:
+            return
+        count = self.count[cells]
+        # At most MAX_PAIRS sample / shade pairs at a time
+        step = max(1, MAX_PAIRS // int(count.max()))
+        for lo in range(0, len(rows), step):
+            sample_rows, n = rows[lo:lo + step], count[lo:lo + step]
+            first = np.cumsum(n) - n
+            sample = np.repeat(sample_rows, n)
+            within = np.arange(n.sum()) - np.repeat(first, n)
+            shade = self.order[np.repeat(self.start[cells[lo:lo + step]], n) + within]
+
+            # Same bound per pair before the full formula
+            diff = lab[sample] - self.palette_lab[shade]
+            keep = np.hypot.reduce(diff * weights[sample], axis=1) <= best[sample] * (1 + 1e-4) + 1e-4
+            d = np.full(len(sample), np.inf, dtype=dtype)
+            d[keep] = CIEDE2000_array(lab[sample[keep]], self.palette_lab[shade[keep]], dtype=dtype)
+
+            # Each sample's pairs are contiguous: closest shade, lowest index first on ties
+            d_min = np.minimum.reduceat(d, first)
+            tied = np.where(d == np.repeat(d_min, n), shade, len(self.palette_lab))
+            shade_min = np.minimum.reduceat(tied, first)
+            better = (d_min < best[sample_rows]) | ((d_min == best[sample_rows]) & (shade_min < best_index[sample_rows]))
+            best[sample_rows[better]] = d_min[better]
+            best_index[sample_rows[better]] = shade_min[better]
+
+    def _band_bound(self, qlo, qhi, plo, phi):
+        gap = max(0.0, plo - qhi, qlo - phi)
+        if gap == 0:
+            return 0.0
+        return gap * L_weight((qlo + plo) / 2, (qhi + phi) / 2)
+
+    def _banded(self, lab, rows, best, best_index, dtype):
+        '''L*-band scan of the samples in rows, grouped by band'''
+        query_band = np.floor(lab[rows, 0] / self.band_width).astype(np.int64)
+        order = np.argsort(query_band, kind="stable")
+        splits = np.flatnonzero(np.diff(query_band[order])) + 1
+        for group in np.split(rows[order], splits):
+            if len(group) == 0:
+                continue
+            qlo, qhi = lab[group, 0].min(), lab[group, 0].max()
+            bounds = [self._band_bound(qlo, qhi, plo, phi) for _, _, plo, phi in self.bands]
+            for k in np.argsort(bounds, kind="stable"):
+                members, band_lab, plo, phi = self.bands[k]
+                active = group[bounds[k] <= best[group] * (1 + 1e-4) + 1e-4]
+                if len(active) == 0:
+                    break
+                j, d = nearest_tone(lab[active], band_lab, dtype=dtype)
+                candidate = members[j]
+                better = (d < best[active]) | ((d == best[active]) & (candidate < best_index[active]))
+                best[active[better]] = d[better]
+                best_index[active[better]] = candidate[better]
+
+
+if __name__ == "__main__":
+    # Timing and exactness against the brute-force scan on synthetic catalogues
+    argv = sys.argv
+    sizes = [int(a) for a in argv[1:]] or [66, 1000, 4000, 16000, 64000]
+    rng = np.random.default_rng(0)
+    names, colors = read_palette("assets/skin_chart_loreal.csv")
+    # Samples near the skin tones, and across the whole sRGB gamut
+    queries = np.concatenate([
+        srgb_to_lab_array((colors[rng.integers(0, len(colors), 5000)] + rng.normal(0, 6, (5000, 3))).clip(0, 255)),
+        srgb_to_lab_array(rng.integers(0, 256, (5000, 3))),
+    ])
+    for size in sizes:
+        catalogue = srgb_to_lab_array((colors[rng.integers(0, len(colors), size)] + rng.normal(0, 15, (size, 3))).clip(0, 255))
+        start = time.perf_counter()
+        index = PaletteIndex(catalogue)
+        i_fast, d_fast = index.query(queries)
+        t_fast = time.perf_counter() - start
+        start = time.perf_counter()
+        i_slow, d_slow = nearest_tone(queries, catalogue)
+        t_slow = time.perf_counter() - start
+        same = np.array_equal(i_fast, i_slow)
+        print(f"{size:6d} shades: index {t_fast:6.2f}s  brute force {t_slow:7.2f}s  identical={same}")
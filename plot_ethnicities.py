@@ -6,6 +6,8 @@ from matplotlib.backend_bases import MouseEvent
 from colormath.color_objects import sRGBColor, LabColor
 from colormath.color_conversions import convert_color
 from cie2000 import CIEDE2000
+from lab_array import lab_to_srgb_array
+from population import files, names, load_population
 import sys
 
 
@@ -64,18 +66,11 @@ def plot_L_vs_b( ax, filename, back=True, title_prefix="Skin Tone Analysis", alp
     """
     Plot L* vs a* and L* vs b* side by side for palette colors and input RGB.
     """
-    data = np.loadtxt("assets/"+filename,delimiter=",")
-    if data.shape == (6,):
-        data = data.reshape((1,6))
-    if back:
-        input_lab = lab_color_parallel(data[:,0],data[:,1],data[:,2])
-    else : 
-        input_lab = lab_color_parallel(data[:,3],data[:,4],data[:,5])
-
-    for i in range(len(input_lab)):
-        lab = input_lab[i]
-        rgb = convert_color(lab, sRGBColor).get_value_tuple()
-        ax.scatter(lab.lab_b, lab.lab_l, color=[c for c in rgb], edgecolor=edgecolor, s=size,alpha=alpha)
+    input_lab = load_population(filename, back)
+
+    # One scatter call for the whole population instead of one per sample
+    rgb = lab_to_srgb_array(input_lab, scale=1.0, illuminant="d50")
+    ax.scatter(input_lab[:,2], input_lab[:,0], color=rgb, edgecolor=edgecolor, s=size,alpha=alpha)
 
     # ax.text(lab_input.lab_a, lab_input.lab_l + 2,
     #         f"Input\nL*={lab_input.lab_l:.1f}, a*={lab_input.lab_a:.1f}",
@@ -94,9 +89,6 @@ def plot_L_vs_b( ax, filename, back=True, title_prefix="Skin Tone Analysis", alp
     
     
 
-files=["Lab_Black.csv",  "Lab_East_Asian.csv",  "Lab_LatinX.csv",  "Lab_MiddleEastern.csv",  "Lab_Mixed.csv",  "Lab_North_African.csv",  "Lab_South_Asian.csv",  "Lab_Southeast_Asian.csv",  "Lab_White.csv", "Lab_All_Ethnicities.csv"]
-names=["Black Skin Tone","East Asian Skin Tone","Latin Skin Tone","Middle Eastern Skin Tone","Mixed Race Skin Tone","North African Skin Tone","South Asian Skin Tone","Southeast Asian Skin Tone","White Skin Tone","All Skin Tone"]
-
 categories = [
     ("Dark",         LabColor(40, 20, 20)),
     ("Brown",        LabColor(55, 15, 20)),
@@ -122,36 +114,34 @@ ITA = np.degrees(np.arctan2(L - 50, b))
 ita_levels = [-30, 10, 28, 41, 55]
 contour_labels = ["Dark", "Brown", "Tan", "Intermediate", "Light", "Very Light"]
 
-fig, axs = plt.subplots(3,3, figsize=(10, 10))
-for i in range(3):
-    for j in range(3):
-        index = i*3 + j
-        if index < len(files)-1:
-            plot_L_vs_b( axs[i,j], "Lab_All_Ethnicities.csv", back=True, alpha=0.15,edgecolor='none')
+def ethnicity_grid(back=True):
+    side = " Back hand" if back else " Front hand"
+    fig, axs = plt.subplots(3,3, figsize=(10, 10))
+    for i in range(3):
+        for j in range(3):
+            index = i*3 + j
+            if index < len(files)-1:
+                plot_L_vs_b( axs[i,j], "Lab_All_Ethnicities.csv", back=back, alpha=0.15,edgecolor='none')
 
-            plot_L_vs_b( axs[i,j], files[index], back=True, title_prefix=names[index]+ " Back hand")
-            line_lab(axs[i,j], b, L, ITA,categories, positions, ita_levels)
-            
+                plot_L_vs_b( axs[i,j], files[index], back=back, title_prefix=names[index]+ side)
+                line_lab(axs[i,j], b, L, ITA,categories, positions, ita_levels)
 
-plt.tight_layout()
+    plt.tight_layout()
+    return fig
 
-fig3, axs3 = plt.subplots(3,3, figsize=(10, 10))
-for i in range(3):
-    for j in range(3):
-        index = i*3 + j
-        if index < len(files)-1:
-            plot_L_vs_b( axs3[i,j], "Lab_All_Ethnicities.csv", back=False, alpha=0.15,edgecolor='none')
 
-            plot_L_vs_b( axs3[i,j], files[index], back=False, title_prefix=names[index]+ " Front hand")
-            line_lab(axs3[i,j], b, L, ITA,categories, positions, ita_levels)
-            
-plt.tight_layout()
+def all_population_figure():
+    fig2, ax2 = plt.subplots(1,2, figsize=(18, 6))
+    plot_L_vs_b( ax2[0], "Lab_All_Ethnicities.csv", back=True, title_prefix="All Skin Tone"+ " Back hand")
+    line_lab(ax2[0], b, L, ITA,categories, positions, ita_levels)
 
-fig2, ax2 = plt.subplots(1,2, figsize=(18, 6))
-plot_L_vs_b( ax2[0], "Lab_All_Ethnicities.csv", back=True, title_prefix="All Skin Tone"+ " Back hand")
-line_lab(ax2[0], b, L, ITA,categories, positions, ita_levels)
+    plot_L_vs_b( ax2[1], "Lab_All_Ethnicities.csv", back=False, title_prefix="All Skin Tone"+ " Front hand")
+    line_lab(ax2[1], b, L, ITA,categories, positions, ita_levels)
+    return fig2
 
-plot_L_vs_b( ax2[1], "Lab_All_Ethnicities.csv", back=False, title_prefix="All Skin Tone"+ " Front hand")
-line_lab(ax2[1], b, L, ITA,categories, positions, ita_levels)
 
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    fig = ethnicity_grid(back=True)
+    fig3 = ethnicity_grid(back=False)
+    fig2 = all_population_figure()
+    plt.show()
@@ -0,0 +1,26 @@
+import numpy as np
+from functools import lru_cache
+
+files=["Lab_Black.csv",  "Lab_East_Asian.csv",  "Lab_LatinX.csv",  "Lab_MiddleEastern.csv",  "Lab_Mixed.csv",  "Lab_North_African.csv",  "Lab_South_Asian.csv",  "Lab_Southeast_Asian.csv",  "Lab_White.csv", "Lab_All_Ethnicities.csv"]
+names=["Black Skin Tone","East Asian Skin Tone","Latin Skin Tone","Middle Eastern Skin Tone","Mixed Race Skin Tone","North African Skin Tone","South Asian Skin Tone","Southeast Asian Skin Tone","White Skin Tone","All Skin Tone"]
+
+palettes = {
+    "L'Oréal": "assets/skin_chart_loreal.csv",
+    "Fitzpatrick": "assets/skin_chart_fitzpatrick.csv",
+}
+
+
+@lru_cache(maxsize=None)
+def _read_population(filename):
+    data = np.loadtxt("assets/"+filename, delimiter=",", ndmin=2)
+    # Shared between callers through the cache, so keep it read-only
+    data.flags.writeable = False
+    return data
+
+
+def load_population(filename, back=True):
+    '''Returns the (N, 3) back hand or front hand Lab samples of an assets/Lab_*.csv file'''
+    data = _read_population(filename)
+    if back:
+        return data[:, 0:3]
+    return data[:, 3:6]
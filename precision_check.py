@@ -0,0 +1,77 @@
+import numpy as np
+import sys
+import time
+from cie2000 import CIEDE2000_array
+from lab_array import read_palette, srgb_to_lab_array, delta_e_matrix
+
+# Compares the float32 conversion + CIEDE2000 path against the float64 reference
+# over the 8-bit RGB cube, for each palette: max Lab / Delta E errors and the
+# number of nearest-tone decisions that flip. Exits non-zero when the float32
+# path is outside the tolerances below.
+
+MAX_CONVERSION_DE = 1e-3
+MAX_FLIP_FRACTION = 1e-4
+
+palettes = ["assets/skin_chart_loreal.csv", "assets/skin_chart_fitzpatrick.csv"]
+
+
+def rgb_slab(r, step):
+    g, b = np.meshgrid(np.arange(0, 256, step), np.arange(0, 256, step), indexing="ij")
+    return np.stack([np.full(g.size, r), g.ravel(), b.ravel()], axis=1).astype(np.uint8)
+
+
+def check_palette(namefile, step):
+    names, colors = read_palette(namefile)
+    palette64 = srgb_to_lab_array(colors, dtype=np.float64)
+    palette32 = srgb_to_lab_array(colors, dtype=np.float32)
+
+    n = 0
+    flips = 0
+    max_lab_err = 0.0
+    max_conv_de = 0.0
+    max_de_err = 0.0
+    t64 = t32 = 0.0
+    for r in range(0, 256, step):
+        rgb = rgb_slab(r, step)
+
+        start = time.perf_counter()
+        lab64 = srgb_to_lab_array(rgb, dtype=np.float64)
+        d64 = delta_e_matrix(lab64, palette64, dtype=np.float64)
+        best64 = np.argmin(d64, axis=1)
+        t64 += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lab32 = srgb_to_lab_array(rgb, dtype=np.float32)
+        d32 = delta_e_matrix(lab32, palette32, dtype=np.float32)
+        best32 = np.argmin(d32, axis=1)
+        t32 += time.perf_counter() - start
+
+        n += len(rgb)
+        flips += int(np.count_nonzero(best64 != best32))
+        max_lab_err = max(max_lab_err, float(np.abs(lab32 - lab64).max()))
+        max_conv_de = max(max_conv_de, float(CIEDE2000_array(lab32, lab64).max()))
+        max_de_err = max(max_de_err, float(np.abs(d32 - d64).max()))
+
+    print(namefile)
+    print(f"  colors checked:            {n}")
+    print(f"  max |Lab32 - Lab64|:       {max_lab_err:.3e}")
+    print(f"  max DE00(Lab32, Lab64):    {max_conv_de:.3e}")
+    print(f"  max |DE32 - DE64|:         {max_de_err:.3e}")
+    print(f"  nearest-tone flips:        {flips} ({100.0 * flips / n:.4f}%)")
+    print(f"  time float64 / float32:    {t64:.1f}s / {t32:.1f}s")
+    print(f"  DE matrix bytes per color: {8 * len(names)} / {4 * len(names)}")
+
+    ok = max_conv_de <= MAX_CONVERSION_DE and flips <= MAX_FLIP_FRACTION * n
+    print(f"  within tolerance:          {ok} (DE00 <= {MAX_CONVERSION_DE:g}, flips <= {100.0 * MAX_FLIP_FRACTION:g}%)")
+    return ok
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) <= 2:
+        step = int(argv[1]) if len(argv) == 2 else 1
+        results = [check_palette(namefile, step) for namefile in palettes]
+        sys.exit(0 if all(results) else 1)
+    else:
+        print("Usage: python precision_check.py [cube_step]")
+        sys.exit(2)
@@ -0,0 +1,47 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from plot_ethnicities import ethnicity_grid, all_population_figure
+
+# Headless regeneration of the report figures in results/, one figure per worker process.
+
+FIGURE_SIZE = (25.6, 13.27)
+DPI = 100
+
+jobs = [
+    ("results/breakdown_back_hand.png", ethnicity_grid, {"back": True}),
+    ("results/breakdown_front_hand.png", ethnicity_grid, {"back": False}),
+    ("results/all_skintones.png", all_population_figure, {}),
+]
+
+
+def render(job):
+    output, build, kwargs = job
+    fig = build(**kwargs)
+    fig.set_size_inches(*FIGURE_SIZE)
+    fig.tight_layout()
+    # Write next to the target and rename so readers never see a partial png
+    tmp = output + ".tmp"
+    fig.savefig(tmp, dpi=DPI, format="png", metadata={"Software": None})
+    plt.close(fig)
+    os.replace(tmp, output)
+    return output
+
+
+def render_all(processes=None):
+    os.makedirs("results", exist_ok=True)
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(render, jobs))
+
+
+if __name__ == "__main__":
+    argv = sys.argv
+    if len(argv) <= 2:
+        processes = int(argv[1]) if len(argv) == 2 else min(len(jobs), os.cpu_count())
+        for output in render_all(processes):
+            print("Saved", output)
+    else:
+        print("Usage: python render_figures.py [processes]")
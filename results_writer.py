@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import glob
+import os
+import threading
+import time
+
+# Columnar results sink. Rows are buffered per table and flushed as numbered
+# .npz parts (one array per column) once enough rows or time have gone by;
+# a background thread flushes rows left waiting when no more are appended.
+# Parts are renamed into place only when complete, so readers can scan a
+# results directory while it is still being written.
+
+RESULTS_DIR = "results/matches"
+
+
+class ResultsWriter:
+
+    def __init__(self, path=RESULTS_DIR, palette_names=("L'Oréal", "Fitzpatrick"), flush_rows=10000, flush_seconds=5.0):
+        self.path = path
+        self.palette_names = list(palette_names)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        os.makedirs(path, exist_ok=True)
+        self.buffers = {"matches": [], "histograms": []}
+        self.last_flush = time.monotonic()
+        # Parts of concurrent writers never collide and still sort by start time
+        self.session = f"{time.time_ns()}-{os.getpid()}"
+        self.part = 0
+        self.lock = threading.RLock()
+        self.closed = threading.Event()
+        if flush_seconds:
+            threading.Thread(target=self._flush_periodically, daemon=True).start()
+
+    def append_match(self, source, lab, tones, delta_e, ita, elapsed, x=-1, y=-1, roi=""):
+        '''One match record; tones and delta_e are given per palette, in palette_names order'''
+        row = {"source": source, "x": x, "y": y, "roi": roi,
+               "L": lab[0], "a": lab[1], "b": lab[2], "ita": ita, "elapsed_ms": 1000 * elapsed}
+        for palette_name, tone, de in zip(self.palette_names, tones, delta_e):
+            row["tone:" + palette_name] = tone
+            row["de:" + palette_name] = de
+        self._append("matches", row)
+
+    def append_histogram(self, source, palette_name, tone_names, counts):
+        '''Per-image tone histogram, one row per shade'''
+        for tone, count in zip(tone_names, counts):
+            self._append("histograms", {"source": source, "palette": palette_name, "tone": tone, "count": int(count)})
+
+    def _append(self, table, row):
+        with self.lock:
+            self.buffers[table].append(row)
+            # flush_seconds of None or 0 turns time-based flushing off, leaving flush_rows and close()
+            due = self.flush_seconds and time.monotonic() - self.last_flush >= self.flush_seconds
+            if len(self.buffers[table]) >= self.flush_rows or due:
+                self.flush()
+
+    def _flush_periodically(self):
+        while not self.closed.wait(self.flush_seconds):
+            if time.monotonic() - self.last_flush >= self.flush_seconds:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            for table, rows in self.buffers.items():
+                if not rows:
+                    continue
+                columns = {key: np.array([row[key] for row in rows]) for key in rows[0]}
+                name = os.path.join(self.path, f"{table}-{self.session}-{self.part:06d}.npz")
+                with open(name + ".tmp", "wb") as f:
+                    np.savez(f, **columns)
+                os.replace(name + ".tmp", name)
+                self.part += 1
+                self.buffers[table] = []
+            self.last_flush = time.monotonic()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_results(path=RESULTS_DIR, table="matches", columns=None):
+    '''Yields one {column: array} dict per flushed part, loading only the requested columns'''
+    for name in sorted(glob.glob(os.path.join(path, f"{table}-*.npz"))):
+        with np.load(name) as data:
+            yield {key: data[key] for key in (columns or data.files)}
+
+
+def read_results(path=RESULTS_DIR, table="matches", columns=None):
+    parts = list(iter_results(path, table, columns))
+    if not parts:
+        return pd.DataFrame()
+    return pd.DataFrame({key: np.concatenate([part[key] for part in parts]) for key in parts[0]})
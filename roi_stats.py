@@ -0,0 +1,53 @@
+import numpy as np
+from matplotlib.path import Path
+from lab_array import srgb_to_lab_array, ita_array
+from palette_index import PaletteIndex
+
+
+def polygon_mask(shape, vertices):
+    '''Boolean (H, W) mask of the pixel centres inside a polygon of (x, y) vertices'''
+    h, w = shape[:2]
+    vertices = np.asarray(vertices, dtype=np.float64)
+    mask = np.zeros((h, w), dtype=bool)
+    # Only test the pixels of the polygon's bounding box, in one contains_points call
+    x0, y0 = np.maximum(np.floor(vertices.min(axis=0)).astype(int), 0)
+    x1, y1 = np.minimum(np.ceil(vertices.max(axis=0)).astype(int) + 1, (w, h))
+    if x0 >= x1 or y0 >= y1:
+        return mask
+    ys, xs = np.mgrid[y0:y1, x0:x1]
+    inside = Path(vertices).contains_points(np.column_stack([xs.ravel(), ys.ravel()]))
+    mask[y0:y1, x0:x1] = inside.reshape(ys.shape)
+    return mask
+
+
+def region_stats(img, mask, tone_maps, palette_names, calibration=None, palette_labs=None):
+    '''Mean / median Lab, ITA and nearest-tone distribution of the pixels in mask.
+
+    tone_maps are the per-palette (H, W) shade index rasters of the image (see
+    analysis_cache), so the tone distribution is a bincount over the region.
+    While they are still being computed (None), the region's pixels are
+    classified directly against palette_labs instead.
+    '''
+    n = int(np.count_nonzero(mask))
+    if n == 0:
+        return None
+    lab = srgb_to_lab_array(img[mask], scale=1.0, dtype=np.float32, calibration=calibration)
+    mean = lab.sum(axis=0, dtype=np.float64) / n
+    median = np.median(lab, axis=0)
+    ita = ita_array(lab)
+    stats = {
+        "pixels": n,
+        "mean_lab": mean,
+        "median_lab": median,
+        "ita_of_mean": float(ita_array(mean)),
+        "median_ita": float(np.median(ita)),
+        "tones": [],
+    }
+    for i, names in enumerate(palette_names):
+        if tone_maps is not None:
+            index = tone_maps[i][mask]
+        else:
+            index, distance = PaletteIndex(palette_labs[i]).query(lab, dtype=np.float32)
+        counts = np.bincount(index, minlength=len(names))
+        stats["tones"].append(dict(zip(names, counts.tolist())))
+    return stats
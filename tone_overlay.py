@@ -0,0 +1,166 @@
+import numpy as np
+import queue
+import threading
+from lab_array import srgb_to_lab_array, lab_to_srgb_array, ita_array
+from palette_index import PaletteIndex
+
+# Progressive tone-map overlay for the click viewer. A coarse downsample is
+# classified and shown straight away, then a background thread refines the
+# overlay tile by tile at full resolution. Finished tiles are handed over
+# through a queue and pasted from a canvas timer, so all drawing stays on the
+# GUI thread. Any change of image, palette or mode cancels the running pass.
+# Once the analysis cache has the image's tone / ITA rasters, the overlay is
+# filled from those at full resolution and nothing is reclassified.
+
+COARSE_SIZE = 128
+TILE = 256
+ALPHA = 160
+
+ita_levels = [-30, 10, 28, 41, 55]
+# Same swatches as the plot_ethnicities categories (colormath LabColor, so D50)
+ita_band_lab = np.array([(40, 20, 20), (55, 15, 20), (65, 10, 20), (75, 5, 10), (85, 2, 5), (95, 0, 2)])
+
+
+class ProgressiveOverlay:
+
+    def __init__(self, ax, img, palettes, calibration=None, mode="tone", tone_maps=None, ita=None):
+        '''palettes is a list of (name, (P, 3) sRGB 0-255 colours)'''
+        self.ax = ax
+        self.img = img
+        self.calibration = calibration
+        self.mode = mode
+        self.palette = 0
+        self.palettes = [(name, colors, PaletteIndex(srgb_to_lab_array(colors))) for name, colors in palettes]
+        self.band_rgb = lab_to_srgb_array(ita_band_lab, illuminant="d50")
+        self.tone_maps = tone_maps
+        self.ita = ita
+        self.artist = None
+        self.visible = False
+        self.cancel_event = threading.Event()
+        self.tiles = queue.Queue()
+        self.timer = ax.figure.canvas.new_timer(interval=100)
+        self.timer.add_callback(self._paste_tiles)
+
+    def classify(self, rgb):
+        '''RGBA uint8 overlay colours for an (h, w, 3) block of the image'''
+        lab = srgb_to_lab_array(rgb, scale=1.0, dtype=np.float32, calibration=self.calibration)
+        if self.mode == "tone":
+            name, colors, index = self.palettes[self.palette]
+            nearest, distance = index.query(lab, dtype=np.float32)
+            rgb_out = colors[nearest]
+        else:
+            rgb_out = self.band_rgb[np.digitize(ita_array(lab).ravel(), ita_levels)]
+        out = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+        out[..., :3] = np.rint(rgb_out).reshape(rgb.shape[:2] + (3,))
+        out[..., 3] = ALPHA
+        return out
+
+    def cached(self):
+        '''Full-resolution overlay from the analysis rasters, or None when there are none for this mode'''
+        if self.mode == "tone" and self.tone_maps is not None:
+            rgb, index = self.palettes[self.palette][1], self.tone_maps[self.palette]
+        elif self.mode == "ita" and self.ita is not None:
+            rgb, index = self.band_rgb, np.digitize(self.ita, ita_levels)
+        else:
+            return None
+        # One RGBA entry per shade / band, gathered by the raster
+        lut = np.empty((len(rgb), 4), dtype=np.uint8)
+        lut[:, :3] = np.rint(rgb)
+        lut[:, 3] = ALPHA
+        return lut[index]
+
+    def title(self):
+        if self.mode == "tone":
+            return f"Overlay: nearest {self.palettes[self.palette][0]} shade"
+        return "Overlay: ITA band"
+
+    def start(self):
+        '''Shows the coarse overlay and starts refining it in the background'''
+        self.cancel()
+        self.cancel_event = threading.Event()
+        self.tiles = queue.Queue()
+
+        h, w = self.img.shape[:2]
+        cached = self.cached()
+        if cached is not None:
+            self.overlay = cached
+        else:
+            step = max(1, max(h, w) // COARSE_SIZE)
+            coarse = self.classify(self.img[::step, ::step, :3])
+            self.overlay = np.repeat(np.repeat(coarse, step, axis=0), step, axis=1)[:h, :w]
+        if self.artist is None:
+            self.artist = self.ax.imshow(self.overlay, extent=(-0.5, w - 0.5, h - 0.5, -0.5), interpolation="nearest", zorder=2)
+        else:
+            self.artist.set_data(self.overlay)
+        self.artist.set_visible(self.visible)
+        self.ax.set_title(self.title())
+        self.ax.figure.canvas.draw_idle()
+        if cached is not None:
+            return
+
+        worker = threading.Thread(target=self._refine, args=(self.cancel_event, self.tiles), daemon=True)
+        worker.start()
+        self.timer.start()
+
+    def _refine(self, cancel_event, tiles):
+        h, w = self.img.shape[:2]
+        for y in range(0, h, TILE):
+            for x in range(0, w, TILE):
+                if cancel_event.is_set():
+                    return
+                tiles.put((y, x, self.classify(self.img[y:y + TILE, x:x + TILE, :3])))
+        tiles.put(None)
+
+    def _paste_tiles(self):
+        changed = False
+        done = False
+        while True:
+            try:
+                tile = self.tiles.get_nowait()
+            except queue.Empty:
+                break
+            if tile is None:
+                done = True
+                break
+            y, x, rgba = tile
+            self.overlay[y:y + rgba.shape[0], x:x + rgba.shape[1]] = rgba
+            changed = True
+        if changed and self.artist is not None:
+            self.artist.set_data(self.overlay)
+            self.ax.figure.canvas.draw_idle()
+        if done:
+            self.timer.stop()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.timer.stop()
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.artist is None:
+            self.start()
+        else:
+            self.artist.set_visible(self.visible)
+            self.ax.figure.canvas.draw_idle()
+
+    def set_image(self, img, tone_maps=None, ita=None):
+        self.img = img
+        self.tone_maps = tone_maps
+        self.ita = ita
+        self.start()
+
+    def set_analysis(self, tone_maps, ita=None):
+        '''Per-palette tone rasters and ITA raster of the current image (see analysis_cache)'''
+        self.tone_maps = tone_maps
+        self.ita = ita
+        if self.artist is not None:
+            self.start()
+
+    def next_palette(self):
+        self.palette = (self.palette + 1) % len(self.palettes)
+        self.mode = "tone"
+        self.start()
+
+    def toggle_mode(self):
+        self.mode = "ita" if self.mode == "tone" else "tone"
+        self.start()